@@ -1,12 +1,311 @@
 import os
 import json
+import functools
+import hashlib
+import io
+import re
 import requests
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Iterator
+
+from cache import SQLiteCache
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    _loads = json.loads
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts fall back to an estimate
+    tiktoken = None
 
 logger = logging.getLogger(__name__)
 
+ONE_DAY = timedelta(days=1)
+
+# Per-method limits: (connect_timeout, read_timeout, max_retries, max_output_tokens)
+CALL_BUDGETS = {
+    "breakdown": (5, 25, 2, 1500),
+    "schedule": (5, 40, 2, 2000),
+    "adapt": (5, 30, 2, 2000),
+    "summary": (5, 20, 1, 1000),
+}
+
+# Successful planning responses are reused for identical inputs for a week; unless
+# overridden the cache file lives in the Flask instance folder, next to the app database
+RESPONSE_CACHE_PATH = os.environ.get("AI_CACHE_PATH")
+RESPONSE_CACHE_TTL = 86400 * 7
+
+# Subjects given only a modest chapter count and no difficulty at all get the local
+# template breakdown; an AI call adds little for them. A difficulty picked on the form,
+# even the preselected "medium", still goes to the AI
+TRIVIAL_MAX_CHAPTERS = 12
+_BASIC_SUBJECT_FIELDS = {"name", "total_chapters", "difficulty", "exam_date"}
+
+# Context window of the configured model, minus headroom for the chat template
+TOKENIZER_MODEL = "gpt-4o"
+MODEL_CONTEXT_TOKENS = 128000
+PROMPT_OVERHEAD_TOKENS = 500
+
+# System prompts are module constants so every call sends a byte-identical,
+# cacheable prefix
+_SYS_BREAKDOWN = """You are an expert study planner. Your task is to break down subjects into specific, manageable chapters with realistic time estimates. 
+                
+                Respond with a JSON object in this format:
+                {
+                  "breakdown": [
+                    {
+                      "subject_name": "Subject Name",
+                      "chapters": [
+                        {
+                          "title": "Chapter Title",
+                          "estimated_hours": 2.5,
+                          "difficulty": "medium",
+                          "key_topics": ["topic1", "topic2"],
+                          "prerequisites": ["prerequisite_chapter"]
+                        }
+                      ]
+                    }
+                  ],
+                  "study_tips": ["tip1", "tip2"],
+                  "reasoning": "Explanation of the breakdown strategy"
+                }"""
+
+_SYS_SCHEDULE = """You are an expert study scheduler. Create an optimal study schedule that maximizes learning efficiency and retention.
+
+                Respond with JSON in this format:
+                {
+                  "schedule": [
+                    {
+                      "date": "2025-08-26",
+                      "sessions": [
+                        {
+                          "chapter_title": "Chapter Name",
+                          "subject": "Subject Name", 
+                          "start_time": "09:00",
+                          "end_time": "11:30",
+                          "duration_hours": 2.5,
+                          "session_type": "new_material",
+                          "break_after": 15
+                        }
+                      ]
+                    }
+                  ],
+                  "scheduling_principles": ["principle1", "principle2"],
+                  "adaptation_suggestions": ["suggestion1", "suggestion2"]
+                }"""
+
+_SYS_ADAPT = """You are an intelligent study schedule adaptation expert. When a study session is missed, provide smart rescheduling that maintains learning effectiveness.
+
+                Respond with JSON:
+                {
+                  "adaptation_plan": {
+                    "reschedule_missed": {
+                      "new_date": "2025-08-27",
+                      "new_time": "14:00",
+                      "duration_adjustment": 0,
+                      "reasoning": "Why this slot works best"
+                    },
+                    "schedule_adjustments": [
+                      {
+                        "original_session": "Chapter X",
+                        "change_type": "reschedule",
+                        "new_date": "2025-08-28", 
+                        "new_time": "16:00",
+                        "reasoning": "Adjustment explanation"
+                      }
+                    ]
+                  },
+                  "impact_analysis": {
+                    "urgency_level": "medium",
+                    "catch_up_difficulty": "manageable",
+                    "recommendations": ["rec1", "rec2"]
+                  },
+                  "reasoning": "Overall adaptation strategy explanation"
+                }"""
+
+_SYS_SUMMARY = """You are an expert study material creator. Generate concise, well-structured study summaries that help students learn effectively. Focus on key concepts, important facts, and memorable explanations."""
+
+# Providers that only cache prompt blocks explicitly tagged with cache_control;
+# OpenAI-routed models cache identical prefixes automatically
+CACHE_CONTROL_PROVIDERS = ("anthropic/", "google/")
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    """Load the model's tokenizer once, on first use"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, estimating token counts: %s", e)
+        return None
+
+def _count_tokens(text: str) -> int:
+    """Count tokens with the model tokenizer, or estimate at ~4 characters per token"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens"""
+    max_tokens = max(0, max_tokens)
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+
+# Outermost {...} span, for replies that wrap the JSON object in prose or fences
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+def _parse_json_content(content: str) -> Dict[str, Any]:
+    """Parse a JSON reply, extracting the object from surrounding text if needed"""
+    try:
+        return _loads(content)
+    except ValueError:
+        # Safety net for routed models that ignore response_format
+        json_match = _JSON_RE.search(content)
+        if json_match:
+            return _loads(json_match.group())
+        raise
+
+def _is_trivial(subject: Dict) -> bool:
+    """True when a subject carries nothing beyond a name, chapter count and exam date"""
+    return (
+        subject['total_chapters'] <= TRIVIAL_MAX_CHAPTERS
+        and subject.get('difficulty') is None
+        and set(subject) <= _BASIC_SUBJECT_FIELDS
+    )
+
+def _cache_key(*parts) -> str:
+    """Stable content hash of JSON-serialisable request inputs"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def _message_text(message: Dict) -> str:
+    """Return the text of a chat message whether its content is a string or blocks"""
+    content = message['content']
+    if isinstance(content, str):
+        return content
+    return "".join(block.get('text', '') for block in content)
+
+@dataclass(slots=True)
+class PlannedSession:
+    """A study session produced by the local fallback scheduler"""
+    chapter_title: str
+    subject: str
+    start_time: str
+    end_time: str
+    duration_hours: float
+    session_type: str = "new_material"
+    break_after: int = 15
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise to the schedule JSON shape returned by the AI"""
+        return {field.name: getattr(self, field.name) for field in _PLANNED_SESSION_FIELDS}
+
+_PLANNED_SESSION_FIELDS = fields(PlannedSession)
+
+class BreakdownBatcher:
+    """Coalesces concurrent subject breakdown requests into a single AI call"""
+    
+    def __init__(self, request_fn, max_wait_ms: int = 250, max_batch: int = 8):
+        self._request_fn = request_fn
+        self._max_wait = max_wait_ms / 1000
+        self._max_batch = max_batch
+        self._condition = threading.Condition()
+        self._pending = []  # (subjects_data, future) pairs waiting for the next flush
+        self._collecting = False
+    
+    def submit(self, subjects_data: List[Dict]) -> Dict[str, Any]:
+        """Queue subjects for the next batch and block until their breakdown is ready"""
+        future = Future()
+        with self._condition:
+            self._pending.append((subjects_data, future))
+            if self._pending_subjects() >= self._max_batch:
+                self._condition.notify_all()
+        
+        while True:
+            with self._condition:
+                # Wait for an answer, or lead the next batch if nobody is collecting one;
+                # callers left over from a full batch are woken to do the same
+                self._condition.wait_for(
+                    lambda: future.done() or (not self._collecting and self._is_pending(future))
+                )
+                if future.done():
+                    break
+                
+                # The leader waits for others to join, then sends at most max_batch subjects
+                self._collecting = True
+                self._condition.wait_for(
+                    lambda: self._pending_subjects() >= self._max_batch,
+                    timeout=self._max_wait
+                )
+                batch = self._take_batch()
+                self._collecting = False
+                self._condition.notify_all()
+            self._dispatch(batch)
+        
+        return future.result()
+    
+    def _pending_subjects(self) -> int:
+        return sum(len(subjects) for subjects, _ in self._pending)
+    
+    def _is_pending(self, future: Future) -> bool:
+        return any(pending is future for _, pending in self._pending)
+    
+    def _take_batch(self) -> List:
+        """Pop the oldest callers whose subjects fit in max_batch (always at least one)"""
+        taken = count = 0
+        for subjects, _ in self._pending:
+            if taken and count + len(subjects) > self._max_batch:
+                break
+            taken += 1
+            count += len(subjects)
+        batch, self._pending = self._pending[:taken], self._pending[taken:]
+        return batch
+    
+    def _dispatch(self, batch: List) -> None:
+        """Send one combined request and hand each caller the part for its subjects"""
+        try:
+            self._resolve(batch)
+        finally:
+            # Wake the callers whose futures are now done
+            with self._condition:
+                self._condition.notify_all()
+    
+    def _resolve(self, batch: List) -> None:
+        """Run the combined request and set every caller's future"""
+        combined = [subject for subjects, _ in batch for subject in subjects]
+        try:
+            result = self._request_fn(combined)
+            by_name = {item['subject_name'].lower(): item for item in result.get('breakdown', [])}
+        except Exception as e:
+            # Every caller falls back to its own per-subject breakdown
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for subjects, future in batch:
+            future.set_result({
+                **result,
+                "breakdown": [
+                    by_name[subject['name'].lower()]
+                    for subject in subjects
+                    if subject['name'].lower() in by_name
+                ]
+            })
+
 class AIStudyAgent:
     """AI-powered study planning and adaptation agent using OpenRouter API"""
     
@@ -15,14 +314,75 @@ class AIStudyAgent:
         self.api_url = "https://openrouter.ai/api/v1/chat/completions"
         self.model = "openai/gpt-4o"
         
-    def _make_api_request(self, messages: List[Dict], max_tokens: int = 1500) -> Dict:
-        """Make a request to OpenRouter API"""
-        headers = {
+        # Reuse a keep-alive connection pool per call budget, since the retry
+        # policy lives on the mounted adapter
+        self._sessions = {
+            key: self._build_session(max_retries)
+            for key, (_, _, max_retries, _) in CALL_BUDGETS.items()
+        }
+        self._breakdown_batcher = BreakdownBatcher(self._request_breakdown)
+        self._cache = SQLiteCache(self._response_cache_path(), table="ai_responses")
+        
+        # Non-interactive summaries go through the OpenAI Batch API directly,
+        # since OpenRouter has no batch endpoint
+        self.openai_api_key = os.environ.get("OPENAI_API_KEY", "")
+        self.openai_api_url = "https://api.openai.com/v1"
+        self._batch_session = requests.Session()
+        self._batch_session.headers.update({"Authorization": f"Bearer {self.openai_api_key}"})
+        
+    @staticmethod
+    def _response_cache_path() -> str:
+        """Location of the persistent response cache"""
+        if RESPONSE_CACHE_PATH is not None:
+            return RESPONSE_CACHE_PATH
+        from application import app
+        os.makedirs(app.instance_path, exist_ok=True)
+        return os.path.join(app.instance_path, "ai_cache.db")
+    
+    def _build_session(self, max_retries: int) -> requests.Session:
+        """Create a pooled session with the static OpenRouter headers"""
+        session = requests.Session()
+        session.headers.update({
             "Authorization": f"Bearer {self.openrouter_api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "http://localhost:5000",  # Required by OpenRouter
             "X-Title": "AI Study Planner"  # Optional, helps with usage tracking
-        }
+        })
+        retries = Retry(
+            total=max_retries,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"]
+        )
+        session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries))
+        return session
+    
+    def _system_message(self, prompt: str) -> Dict:
+        """Build a system message, tagging it for prompt caching where required"""
+        if self.model.startswith(CACHE_CONTROL_PROVIDERS):
+            return {
+                "role": "system",
+                "content": [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+            }
+        return {"role": "system", "content": prompt}
+    
+    def _truncate_messages(self, messages: List[Dict], max_tokens: int) -> List[Dict]:
+        """Trim the user message so the prompt plus the response fit the model context"""
+        budget = MODEL_CONTEXT_TOKENS - max_tokens - PROMPT_OVERHEAD_TOKENS
+        used = sum(_count_tokens(_message_text(message)) for message in messages)
+        logger.debug("Prompt uses %s of %s input tokens", used, budget)
+        if used <= budget:
+            return messages
+        
+        logger.warning("Prompt of %s tokens exceeds budget of %s, truncating user message", used, budget)
+        last = messages[-1]
+        keep_tokens = _count_tokens(last['content']) - (used - budget)
+        return messages[:-1] + [{**last, "content": _truncate_to_tokens(last['content'], keep_tokens)}]
+    
+    def _request_payload(self, messages: List[Dict], budget_key: str, json_mode: bool = False):
+        """Build the request body and (connect, read) timeout for the named call budget"""
+        connect_timeout, read_timeout, _, max_tokens = CALL_BUDGETS[budget_key]
+        messages = self._truncate_messages(messages, max_tokens)
         
         data = {
             "model": self.model,
@@ -30,47 +390,97 @@ class AIStudyAgent:
             "max_tokens": max_tokens,
             "temperature": 0.7
         }
+        if json_mode:
+            # Ask the provider for a bare JSON object instead of free text
+            data["response_format"] = {"type": "json_object"}
+        
+        return data, (connect_timeout, read_timeout)
+    
+    def _make_api_request(self, messages: List[Dict], budget_key: str, json_mode: bool = False) -> Dict:
+        """Make a request to OpenRouter API within the named call budget"""
+        data, timeout = self._request_payload(messages, budget_key, json_mode)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
+            response = self._sessions[budget_key].post(self.api_url, json=data, timeout=timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            logger.error(f"OpenRouter API request failed: {e}")
-            raise Exception(f"AI service unavailable: {e}")
+            logger.error("OpenRouter API request failed: %s", e)
+            raise RuntimeError("AI service unavailable") from e
+    
+    def _stream_api_request(self, messages: List[Dict], budget_key: str) -> Iterator[str]:
+        """Stream a completion from OpenRouter, yielding content deltas as they arrive"""
+        data, timeout = self._request_payload(messages, budget_key)
+        data["stream"] = True
+        
+        try:
+            with self._sessions[budget_key].post(self.api_url, json=data, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                # SSE is always UTF-8; requests would otherwise assume ISO-8859-1 for text/*
+                response.encoding = "utf-8"
+                
+                # Server-sent events: payloads arrive on "data: " lines, anything
+                # else is a keep-alive comment
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data: "):
+                        continue
+                    payload = line[len("data: "):]
+                    if payload == "[DONE]":
+                        break
+                    
+                    delta = _loads(payload)['choices'][0].get('delta', {}).get('content')
+                    if delta:
+                        yield delta
+        except requests.exceptions.RequestException as e:
+            logger.error("OpenRouter streaming request failed: %s", e)
+            raise RuntimeError("AI service unavailable") from e
     
     def break_down_subjects(self, subjects_data: List[Dict]) -> Dict[str, Any]:
         """Break down subjects into manageable chapters using AI"""
-        subjects_text = "\n".join([
+        trivial = [subj for subj in subjects_data if _is_trivial(subj)]
+        complex_subjects = [subj for subj in subjects_data if not _is_trivial(subj)]
+        logger.info("Breakdown routing: %d of %d subjects handled locally", len(trivial), len(subjects_data))
+        
+        if not complex_subjects:
+            return self._template_breakdown(trivial, "Standard breakdown for evenly paced subjects")
+        
+        result = self._ai_breakdown(complex_subjects)
+        if trivial:
+            local = self._template_breakdown(trivial, "")
+            result = {**result, "breakdown": result.get('breakdown', []) + local['breakdown']}
+        return result
+    
+    def _ai_breakdown(self, subjects_data: List[Dict]) -> Dict[str, Any]:
+        """Break down subjects with the AI, using cached results where possible"""
+        cache_key = _cache_key("breakdown", self.model, sorted(subjects_data, key=lambda subj: subj['name']))
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            result = self._breakdown_batcher.submit(subjects_data)
+        except Exception as e:
+            logger.error("Subject breakdown failed: %s", e)
+            # Return a fallback structure
+            return self._fallback_subject_breakdown(subjects_data)
+        
+        # A reply that dropped or renamed a subject is used this once but not cached
+        returned = {item.get('subject_name', '').lower() for item in result.get('breakdown', [])}
+        if all(subj['name'].lower() in returned for subj in subjects_data):
+            self._cache.set(cache_key, result, expire=RESPONSE_CACHE_TTL)
+        else:
+            logger.warning("Subject breakdown is missing subjects; not caching it")
+        return result
+    
+    def _request_breakdown(self, subjects_data: List[Dict]) -> Dict[str, Any]:
+        """Send a single breakdown request covering all the given subjects"""
+        subjects_text = "\n".join(
             f"- {subj['name']}: {subj['total_chapters']} chapters, difficulty: {subj.get('difficulty', 'medium')}, exam date: {subj['exam_date']}"
             for subj in subjects_data
-        ])
+        )
         
         messages = [
-            {
-                "role": "system",
-                "content": """You are an expert study planner. Your task is to break down subjects into specific, manageable chapters with realistic time estimates. 
-                
-                Respond with a JSON object in this format:
-                {
-                  "breakdown": [
-                    {
-                      "subject_name": "Subject Name",
-                      "chapters": [
-                        {
-                          "title": "Chapter Title",
-                          "estimated_hours": 2.5,
-                          "difficulty": "medium",
-                          "key_topics": ["topic1", "topic2"],
-                          "prerequisites": ["prerequisite_chapter"]
-                        }
-                      ]
-                    }
-                  ],
-                  "study_tips": ["tip1", "tip2"],
-                  "reasoning": "Explanation of the breakdown strategy"
-                }"""
-            },
+            self._system_message(_SYS_BREAKDOWN),
             {
                 "role": "user",
                 "content": f"""Please break down these subjects for exam preparation:
@@ -85,33 +495,51 @@ Consider:
             }
         ]
         
+        response = self._make_api_request(messages, "breakdown", json_mode=True)
+        content = response['choices'][0]['message']['content']
+        return _parse_json_content(content)
+    
+    def create_study_schedule(self, chapters_data: List[Dict], plan_config: Dict) -> Dict[str, Any]:
+        """Create an intelligent study schedule using AI"""
+        cache_key = _cache_key("schedule", self.model, chapters_data, plan_config)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        messages = self._schedule_messages(chapters_data, plan_config)
+        
         try:
-            response = self._make_api_request(messages)
+            response = self._make_api_request(messages, "schedule", json_mode=True)
             content = response['choices'][0]['message']['content']
-            
-            # Try to parse JSON from the response
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # If direct JSON parsing fails, try to extract JSON from the response
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                else:
-                    raise Exception("Could not parse AI response as JSON")
-                    
+            result = _parse_json_content(content)
         except Exception as e:
-            logger.error(f"Subject breakdown failed: {e}")
-            # Return a fallback structure
-            return self._fallback_subject_breakdown(subjects_data)
+            logger.error("Schedule creation failed: %s", e)
+            return self._fallback_schedule(chapters_data, plan_config)
+        
+        self._cache.set(cache_key, result, expire=RESPONSE_CACHE_TTL)
+        return result
     
-    def create_study_schedule(self, chapters_data: List[Dict], plan_config: Dict) -> Dict[str, Any]:
-        """Create an intelligent study schedule using AI"""
-        chapters_text = "\n".join([
-            f"- {ch['title']} ({ch['subject_name']}): {ch['estimated_hours']}h, difficulty: {ch['difficulty']}"
+    def _schedule_messages(self, chapters_data: List[Dict], plan_config: Dict) -> List[Dict]:
+        """Build the chat messages for a schedule request"""
+        # The chapter list is the largest prompt section, so write it into one buffer
+        buffer = io.StringIO()
+        buffer.writelines(
+            f"- {ch['title']} ({ch['subject_name']}): {ch['estimated_hours']}h, difficulty: {ch['difficulty']}\n"
             for ch in chapters_data
-        ])
+        )
+        chapters_text = buffer.getvalue()
+        
+        if chapters_text:
+            # Trim the chapter list itself, at a line boundary, so the plan configuration
+            # and scheduling principles after it always reach the model
+            _, _, _, max_tokens = CALL_BUDGETS["schedule"]
+            fixed_tokens = sum(_count_tokens(_message_text(message)) for message in self._schedule_messages([], plan_config))
+            chapters_budget = MODEL_CONTEXT_TOKENS - max_tokens - PROMPT_OVERHEAD_TOKENS - fixed_tokens
+            trimmed = _truncate_to_tokens(chapters_text, chapters_budget)
+            if trimmed != chapters_text:
+                chapters_text = trimmed[:trimmed.rfind("\n") + 1]
+                logger.warning("Schedule prompt too long, sending %d of %d chapters",
+                               chapters_text.count("\n"), len(chapters_data))
         
         config_text = f"""
         Study Plan Configuration:
@@ -122,33 +550,8 @@ Consider:
         - Break Preferences: {plan_config.get('break_preferences', 'Standard breaks')}
         """
         
-        messages = [
-            {
-                "role": "system", 
-                "content": """You are an expert study scheduler. Create an optimal study schedule that maximizes learning efficiency and retention.
-
-                Respond with JSON in this format:
-                {
-                  "schedule": [
-                    {
-                      "date": "2025-08-26",
-                      "sessions": [
-                        {
-                          "chapter_title": "Chapter Name",
-                          "subject": "Subject Name", 
-                          "start_time": "09:00",
-                          "end_time": "11:30",
-                          "duration_hours": 2.5,
-                          "session_type": "new_material",
-                          "break_after": 15
-                        }
-                      ]
-                    }
-                  ],
-                  "scheduling_principles": ["principle1", "principle2"],
-                  "adaptation_suggestions": ["suggestion1", "suggestion2"]
-                }"""
-            },
+        return [
+            self._system_message(_SYS_SCHEDULE),
             {
                 "role": "user",
                 "content": f"""Create an optimal study schedule for these chapters:
@@ -165,24 +568,6 @@ Apply these scheduling principles:
 5. Progressive difficulty increase"""
             }
         ]
-        
-        try:
-            response = self._make_api_request(messages, max_tokens=2000)
-            content = response['choices'][0]['message']['content']
-            
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                else:
-                    raise Exception("Could not parse schedule JSON")
-                    
-        except Exception as e:
-            logger.error(f"Schedule creation failed: {e}")
-            return self._fallback_schedule(chapters_data, plan_config)
     
     def adapt_schedule_for_missed_session(self, missed_session: Dict, upcoming_sessions: List[Dict], 
                                         current_progress: Dict) -> Dict[str, Any]:
@@ -196,10 +581,10 @@ Apply these scheduling principles:
         - Reason: {missed_session.get('miss_reason', 'Not specified')}
         """
         
-        upcoming_info = "\n".join([
+        upcoming_info = "\n".join(
             f"- {sess['chapter_title']}: {sess['scheduled_date']} ({sess['duration_hours']}h)"
             for sess in upcoming_sessions[:10]  # Limit to next 10 sessions
-        ])
+        )
         
         progress_info = f"""
         Current Progress:
@@ -210,37 +595,7 @@ Apply these scheduling principles:
         """
         
         messages = [
-            {
-                "role": "system",
-                "content": """You are an intelligent study schedule adaptation expert. When a study session is missed, provide smart rescheduling that maintains learning effectiveness.
-
-                Respond with JSON:
-                {
-                  "adaptation_plan": {
-                    "reschedule_missed": {
-                      "new_date": "2025-08-27",
-                      "new_time": "14:00",
-                      "duration_adjustment": 0,
-                      "reasoning": "Why this slot works best"
-                    },
-                    "schedule_adjustments": [
-                      {
-                        "original_session": "Chapter X",
-                        "change_type": "reschedule",
-                        "new_date": "2025-08-28", 
-                        "new_time": "16:00",
-                        "reasoning": "Adjustment explanation"
-                      }
-                    ]
-                  },
-                  "impact_analysis": {
-                    "urgency_level": "medium",
-                    "catch_up_difficulty": "manageable",
-                    "recommendations": ["rec1", "rec2"]
-                  },
-                  "reasoning": "Overall adaptation strategy explanation"
-                }"""
-            },
+            self._system_message(_SYS_ADAPT),
             {
                 "role": "user",
                 "content": f"""A study session was missed and needs intelligent rescheduling:
@@ -262,32 +617,54 @@ Please provide an adaptation plan that:
         ]
         
         try:
-            response = self._make_api_request(messages, max_tokens=2000)
+            response = self._make_api_request(messages, "adapt", json_mode=True)
             content = response['choices'][0]['message']['content']
-            
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                else:
-                    raise Exception("Could not parse adaptation JSON")
-                    
+            return _parse_json_content(content)
         except Exception as e:
-            logger.error(f"Schedule adaptation failed: {e}")
+            logger.error("Schedule adaptation failed: %s", e)
             return self._fallback_adaptation(missed_session, upcoming_sessions)
     
     def generate_study_summary(self, topic: str, wikipedia_content: str = None) -> str:
         """Generate a concise study summary for a topic"""
+        messages = self._summary_messages(topic, wikipedia_content)
+        
+        try:
+            response = self._make_api_request(messages, "summary")
+            return response['choices'][0]['message']['content']
+        except Exception as e:
+            logger.error("Summary generation failed: %s", e)
+            return self._fallback_summary(topic)
+    
+    def generate_study_summary_stream(self, topic: str, wikipedia_content: str = None,
+                                      fallback: bool = True) -> Iterator[str]:
+        """Generate a study summary for a topic, yielding text as it is produced
+        
+        With fallback=False a failed stream raises instead of ending with the fallback text,
+        so callers can tell a partial summary from a complete one.
+        """
+        messages = self._summary_messages(topic, wikipedia_content)
+        
+        try:
+            yield from self._stream_api_request(messages, "summary")
+        except Exception as e:
+            logger.error("Summary streaming failed: %s", e)
+            if not fallback:
+                raise
+            yield self._fallback_summary(topic)
+    
+    def _summary_messages(self, topic: str, wikipedia_content: str = None) -> List[Dict]:
+        """Build the chat messages for a study summary request"""
+        if wikipedia_content:
+            # Trim the Wikipedia context itself instead of the instructions after it
+            _, _, _, max_tokens = CALL_BUDGETS["summary"]
+            fixed_tokens = sum(_count_tokens(_message_text(message)) for message in self._summary_messages(topic))
+            context_budget = MODEL_CONTEXT_TOKENS - max_tokens - PROMPT_OVERHEAD_TOKENS - fixed_tokens
+            wikipedia_content = _truncate_to_tokens(wikipedia_content, context_budget)
+        
         content_text = f"\nAdditional context from Wikipedia:\n{wikipedia_content}" if wikipedia_content else ""
         
-        messages = [
-            {
-                "role": "system",
-                "content": """You are an expert study material creator. Generate concise, well-structured study summaries that help students learn effectively. Focus on key concepts, important facts, and memorable explanations."""
-            },
+        return [
+            self._system_message(_SYS_SUMMARY),
             {
                 "role": "user", 
                 "content": f"""Create a comprehensive study summary for: {topic}
@@ -304,22 +681,122 @@ Structure the summary with:
 Keep it concise but thorough, suitable for exam preparation."""
             }
         ]
+    
+    def submit_summary_batch(self, chapters: List) -> str:
+        """Queue study summaries for many chapters through the OpenAI Batch API"""
+        # One chat completion request per chapter, matched back up by custom_id
+        _, _, _, max_tokens = CALL_BUDGETS["summary"]
+        lines = []
+        for chapter in chapters:
+            lines.append(json.dumps({
+                "custom_id": f"chapter-{chapter.id}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model.split("/", 1)[-1],
+                    "messages": self._summary_messages(chapter.title, chapter.wikipedia_content),
+                    "max_tokens": max_tokens
+                }
+            }))
         
         try:
-            response = self._make_api_request(messages, max_tokens=1000)
-            return response['choices'][0]['message']['content']
-        except Exception as e:
-            logger.error(f"Summary generation failed: {e}")
-            return f"Summary for {topic}:\n\n[AI summary generation temporarily unavailable. Please review your study materials and create notes manually.]"
+            upload = self._batch_session.post(
+                f"{self.openai_api_url}/files",
+                data={"purpose": "batch"},
+                files={"file": ("summaries.jsonl", "\n".join(lines).encode("utf-8"))},
+                timeout=(5, 60)
+            )
+            upload.raise_for_status()
+            
+            batch = self._batch_session.post(
+                f"{self.openai_api_url}/batches",
+                json={
+                    "input_file_id": upload.json()["id"],
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h"
+                },
+                timeout=(5, 30)
+            )
+            batch.raise_for_status()
+            return batch.json()["id"]
+        except requests.exceptions.RequestException as e:
+            logger.error("Summary batch submission failed: %s", e)
+            raise RuntimeError("Batch service unavailable") from e
+    
+    def get_summary_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Check a summary batch and collect its results once it has finished"""
+        try:
+            response = self._batch_session.get(f"{self.openai_api_url}/batches/{batch_id}", timeout=(5, 30))
+            response.raise_for_status()
+            batch = response.json()
+            
+            if batch["status"] != "completed" or not batch.get("output_file_id"):
+                return {"status": batch["status"], "summaries": {}}
+            
+            output = self._batch_session.get(
+                f"{self.openai_api_url}/files/{batch['output_file_id']}/content", timeout=(5, 60)
+            )
+            output.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Summary batch lookup failed: %s", e)
+            raise RuntimeError("Batch service unavailable") from e
+        
+        summaries = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            result = _loads(line)
+            body = (result.get("response") or {}).get("body") or {}
+            if body.get("choices"):
+                chapter_id = int(result["custom_id"].split("-", 1)[1])
+                summaries[chapter_id] = body["choices"][0]["message"]["content"]
+        
+        return {"status": "completed", "summaries": summaries}
+    
+    def plan_all(self, subjects_data: List[Dict], summary_topics: List[str] = None) -> Dict[str, Any]:
+        """Run the subject breakdown and topic summaries concurrently"""
+        # The calls are independent and network-bound, so total latency is the
+        # slowest call rather than the sum; they share the pooled session
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            breakdown_future = executor.submit(self.break_down_subjects, subjects_data)
+            summaries = self.generate_summaries_bulk(summary_topics or [])
+            
+            return {
+                "breakdown": breakdown_future.result(),
+                "summaries": summaries
+            }
+    
+    def generate_summaries_bulk(self, chapter_topics: List[str], concurrency: int = 8) -> Dict[str, str]:
+        """Generate summaries for many topics with at most `concurrency` requests in flight"""
+        if not chapter_topics:
+            return {}
+        
+        # generate_study_summary applies the summary budget and never raises,
+        # so one slow or failed topic cannot sink the rest
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(chapter_topics))) as executor:
+            return dict(zip(chapter_topics, executor.map(self.generate_study_summary, chapter_topics)))
+    
+    def _fallback_summary(self, topic: str) -> str:
+        """Fallback summary text when AI generation fails"""
+        return f"Summary for {topic}:\n\n[AI summary generation temporarily unavailable. Please review your study materials and create notes manually.]"
+    
+    def is_fallback_summary(self, topic: str, summary: str) -> bool:
+        """Whether a summary is the placeholder returned when generation failed"""
+        return summary == self._fallback_summary(topic)
     
     def _fallback_subject_breakdown(self, subjects_data: List[Dict]) -> Dict[str, Any]:
         """Fallback method when AI breakdown fails"""
+        return self._template_breakdown(subjects_data, "Fallback breakdown due to AI service unavailability")
+    
+    def _template_breakdown(self, subjects_data: List[Dict], reasoning: str) -> Dict[str, Any]:
+        """Build a uniform chapter-by-chapter breakdown without calling the AI"""
         breakdown = []
         for subject in subjects_data:
             chapters = []
             for i in range(subject['total_chapters']):
                 chapters.append({
-                    "title": f"Chapter {i+1}",
+                    # Sessions are matched to chapters by title, so titles must not repeat across subjects
+                    "title": f"{subject['name']} - Chapter {i+1}",
                     "estimated_hours": 2.0,
                     "difficulty": subject.get('difficulty', 'medium'),
                     "key_topics": [f"Topic {i+1}"],
@@ -334,47 +811,52 @@ Keep it concise but thorough, suitable for exam preparation."""
         return {
             "breakdown": breakdown,
             "study_tips": ["Review regularly", "Take breaks", "Practice with examples"],
-            "reasoning": "Fallback breakdown due to AI service unavailability"
+            "reasoning": reasoning
         }
     
     def _fallback_schedule(self, chapters_data: List[Dict], plan_config: Dict) -> Dict[str, Any]:
         """Fallback scheduling when AI fails"""
         # Simple round-robin scheduling
         schedule = []
-        start_date = datetime.strptime(plan_config['start_date'], '%Y-%m-%d')
+        start_date = date.fromisoformat(plan_config['start_date'])
+        end_date = date.fromisoformat(plan_config['end_date'])
         daily_hours = plan_config['daily_hours']
         
         current_date = start_date
-        chapters_queue = chapters_data.copy()
+        chapters_queue = chapters_data
         
-        while chapters_queue and current_date.strftime('%Y-%m-%d') <= plan_config['end_date']:
+        while chapters_queue and current_date <= end_date:
             daily_sessions = []
             remaining_hours = daily_hours
+            deferred = []  # chapters that did not fit today, in their original order
             
-            for chapter in chapters_queue[:]:
+            for chapter in chapters_queue:
                 if remaining_hours >= chapter['estimated_hours']:
-                    daily_sessions.append({
-                        "chapter_title": chapter['title'],
-                        "subject": chapter['subject_name'],
-                        "start_time": "09:00",
-                        "end_time": "11:00",
-                        "duration_hours": chapter['estimated_hours'],
-                        "session_type": "new_material",
-                        "break_after": 15
-                    })
+                    daily_sessions.append(PlannedSession(
+                        chapter_title=chapter['title'],
+                        subject=chapter['subject_name'],
+                        start_time="09:00",
+                        end_time="11:00",
+                        duration_hours=chapter['estimated_hours']
+                    ))
                     remaining_hours -= chapter['estimated_hours']
-                    chapters_queue.remove(chapter)
+                else:
+                    deferred.append(chapter)
             
-            if daily_sessions:
-                schedule.append({
-                    "date": current_date.strftime('%Y-%m-%d'),
-                    "sessions": daily_sessions
-                })
+            if not daily_sessions:
+                # Every day has the same capacity, so nothing left will ever fit
+                break
+            
+            schedule.append((current_date.isoformat(), daily_sessions))
+            chapters_queue = deferred
             
-            current_date += timedelta(days=1)
+            current_date += ONE_DAY
         
         return {
-            "schedule": schedule,
+            "schedule": [
+                {"date": day, "sessions": [session.to_dict() for session in sessions]}
+                for day, sessions in schedule
+            ],
             "scheduling_principles": ["Basic time allocation", "Sequential chapter progression"],
             "adaptation_suggestions": ["Monitor progress", "Adjust as needed"]
         }
@@ -1,10 +1,16 @@
 import os
 import logging
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; Flask's stdlib provider is used without it
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -13,10 +19,28 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # Dates still go through Flask's default so responses keep their format
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///study_planner.db")
@@ -24,12 +48,20 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if orjson is not None:
+    # JSON columns (adaptation changes, preferred times) are encoded/decoded with orjson too
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+        json_serializer=lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode(),
+        json_deserializer=orjson.loads,
+    )
 
 # Initialize the app with the extension
 db.init_app(app)
 
 with app.app_context():
     # Import models to ensure tables are created
+    import models  # noqa: F401
+
     db.create_all()
 
 # Import routes
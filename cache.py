@@ -0,0 +1,80 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class SQLiteCache:
+    """Persistent key/value cache with per-entry expiry, stored in a SQLite file"""
+
+    def __init__(self, path: str, table: str = "cache"):
+        self._table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Cache read failed: %s", e)
+            return None
+
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, expire: Optional[float] = None) -> None:
+        """Store a JSON-serialisable value, optionally expiring after `expire` seconds"""
+        expires_at = time.time() + expire if expire else None
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self._table} (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(value))
+                )
+        except sqlite3.Error as e:
+            logger.warning("Cache write failed: %s", e)
+
+
+class TTLCache:
+    """Small in-process cache whose entries expire after a fixed number of seconds"""
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key: Any) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        """Store a value; the oldest entry is evicted once the cache is full"""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self._maxsize:
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self._ttl, value)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
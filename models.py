@@ -1,7 +1,10 @@
 from application import db
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-import json
+from sqlalchemy.dialects.postgresql import JSONB
+
+# JSONB on PostgreSQL, JSON-encoded text on other backends such as SQLite
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
 
 class Subject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,10 +14,14 @@ class Subject(db.Model):
     exam_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relationship with chapters
-    chapters = db.relationship('Chapter', backref='subject', lazy=True, cascade='all, delete-orphan')
+    # Relationship with chapters; every subject listing shows chapter counts, so load them in bulk
+    chapters = db.relationship('Chapter', backref='subject', lazy='selectin', cascade='all, delete-orphan')
 
 class Chapter(db.Model):
+    __table_args__ = (
+        db.Index('ix_chapter_subject_completed', 'subject_id', 'is_completed'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -29,6 +36,13 @@ class Chapter(db.Model):
     sessions = db.relationship('StudySession', backref='chapter', lazy=True, cascade='all, delete-orphan')
 
 class StudySession(db.Model):
+    __table_args__ = (
+        db.Index('ix_session_chapter_date_status', 'chapter_id', 'scheduled_date', 'status'),
+        db.Index('ix_session_status_end', 'status', 'actual_end_time'),
+        db.Index('ix_session_status_date', 'status', 'scheduled_date'),
+        db.Index('ix_session_chapter_status', 'chapter_id', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False)
     scheduled_date = db.Column(db.DateTime, nullable=False)
@@ -47,27 +61,35 @@ class StudyPlan(db.Model):
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     total_study_hours_per_day = db.Column(db.Float, default=6.0)
-    preferred_study_times = db.Column(db.Text)  # JSON string of preferred time slots
+    preferred_study_times = db.Column(JSONType)  # List of preferred time slots
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def get_preferred_times(self):
         """Return preferred study times as a list"""
-        if self.preferred_study_times:
-            return json.loads(self.preferred_study_times)
+        if self.preferred_study_times is not None:
+            return self.preferred_study_times
         return ["09:00-12:00", "14:00-17:00", "19:00-22:00"]  # Default slots
     
     def set_preferred_times(self, times_list):
         """Set preferred study times from a list"""
-        self.preferred_study_times = json.dumps(times_list)
+        self.preferred_study_times = list(times_list)
 
 class ScheduleAdaptation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     original_session_id = db.Column(db.Integer, db.ForeignKey('study_session.id'), nullable=False)
     adaptation_reason = db.Column(db.String(100), nullable=False)  # missed_session, difficulty_adjustment, etc.
     ai_reasoning = db.Column(db.Text)  # AI's explanation for the adaptation
-    changes_made = db.Column(db.Text)  # JSON string describing what was changed
+    changes_made = db.Column(JSONType)  # Adaptation plan describing what was changed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     original_session = db.relationship('StudySession', backref='adaptations')
+
+class SummaryBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(100), nullable=False, unique=True)  # Provider batch id
+    status = db.Column(db.String(20), default='submitted')  # submitted, completed, failed
+    chapter_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
     
\ No newline at end of file
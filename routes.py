@@ -1,36 +1,188 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import (
+    Response,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    flash,
+    g,
+    jsonify,
+    stream_with_context,
+)
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict
+import functools
+import hashlib
+import json
 import logging
+import threading
+import time
+
+import click
+from sqlalchemy.orm import joinedload, selectinload
 
 from application import app, db
-from models import Subject, Chapter, StudySession, StudyPlan, ScheduleAdaptation
+from models import Subject, Chapter, StudySession, StudyPlan, ScheduleAdaptation, SummaryBatch
 from ai_agent import AIStudyAgent
+from cache import TTLCache
 from scheduler import ScheduleManager
 from wikipedia_service import wikipedia_service
 
 logger = logging.getLogger(__name__)
 
-# Initialize services
-ai_agent = AIStudyAgent()
-schedule_manager = ScheduleManager()
+
+# Services are created on first use so importing routes stays cheap
+@functools.cache
+def get_ai_agent() -> AIStudyAgent:
+    """Return the process-wide AI agent, creating it on first call."""
+    return AIStudyAgent()
+
+
+@functools.cache
+def get_schedule_manager() -> ScheduleManager:
+    """Return the process-wide schedule manager, creating it on first call."""
+    return ScheduleManager()
+
+
+# Streamed summary tokens are coalesced into events at most this often (seconds)
+SSE_FLUSH_INTERVAL = 0.05
+
+# Dashboard aggregates are reused for this long unless a write invalidates them
+DASHBOARD_CACHE_TTL = 30
+_dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL)
+
+# Fetched Wikipedia content and AI summaries are shared by chapters with the same title
+CONTENT_CACHE_TTL = 6 * 60 * 60
+_content_cache = TTLCache(ttl=CONTENT_CACHE_TTL, maxsize=2048)
+
+# AI rescheduling after a missed session runs off the request thread
+_reschedule_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="reschedule")
+_reschedule_jobs: Dict[int, Future] = {}
+_reschedule_jobs_lock = threading.Lock()  # request threads prune and add jobs concurrently
 
 
 def _wants_json() -> bool:
-    """Detect if request expects JSON (AJAX/fetch)."""
-    if request.is_json:
-        return True
-    accept = (request.headers.get("Accept") or "").lower()
-    xrw = (request.headers.get("X-Requested-With") or "").lower()
-    return "application/json" in accept or xrw == "xmlhttprequest"
+    """Detect if request expects JSON (AJAX/fetch); computed once per request."""
+    wants = g.get("_wants_json")
+    if wants is None:
+        accept = (request.headers.get("Accept") or "").lower()
+        xrw = (request.headers.get("X-Requested-With") or "").lower()
+        wants = request.is_json or "application/json" in accept or xrw == "xmlhttprequest"
+        g._wants_json = wants
+    return wants
+
+
+def _sse_event(data: str, event: str = None) -> str:
+    """Format one server-sent event; the payload is JSON-encoded so newlines survive."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _cached_dashboard(name: str, fn, *args):
+    """Return fn(*args) from the dashboard cache, keyed by name, args and day."""
+    key = (name, args, datetime.now().date())
+    value = _dashboard_cache.get(key)
+    if value is None:
+        value = fn(*args)
+        _dashboard_cache.set(key, value)
+    return value
+
+
+def _invalidate_dashboard() -> None:
+    """Drop cached dashboard aggregates after a write."""
+    _dashboard_cache.clear()
+
+
+def _do_reschedule(session_id: int, reason: str) -> bool:
+    """Ask the AI agent to adapt the schedule around a missed session (runs in a worker)."""
+    with app.app_context():
+        try:
+            session = db.session.get(StudySession, session_id, options=[joinedload(StudySession.chapter)])
+            if not session:
+                return False
+
+            missed_session_data = {
+                "chapter_title": session.chapter.title,
+                "scheduled_date": session.scheduled_date.strftime("%Y-%m-%d"),
+                "start_time": session.scheduled_date.strftime("%H:%M"),
+                "duration_hours": session.duration_hours,
+                "miss_reason": reason,
+            }
+            upcoming_sessions = get_schedule_manager().get_current_schedule(days_ahead=14)
+            progress = get_schedule_manager().get_study_progress()
+
+            adaptation = get_ai_agent().adapt_schedule_for_missed_session(
+                missed_session_data, upcoming_sessions, progress
+            )
+
+            return get_schedule_manager().apply_schedule_adaptation(
+                adaptation, session_id, f"missed_session: {reason}"
+            )
+        except Exception as e:
+            logger.warning("AI reschedule failed: %s", e)
+            return False
+        finally:
+            _invalidate_dashboard()
+
+
+def _submit_reschedule(session_id: int, reason: str) -> None:
+    """Queue a background reschedule, forgetting jobs that have already finished."""
+    with _reschedule_jobs_lock:
+        for sid in [sid for sid, job in _reschedule_jobs.items() if job.done()]:
+            del _reschedule_jobs[sid]
+        _reschedule_jobs[session_id] = _reschedule_executor.submit(_do_reschedule, session_id, reason)
+
+
+def _progress_chart_etag() -> str:
+    """Fingerprint everything the progress chart depends on, in a single query."""
+    state = db.session.execute(
+        db.select(
+            db.select(db.func.count(StudySession.id)).scalar_subquery(),
+            db.select(db.func.max(StudySession.updated_at)).scalar_subquery(),
+            db.select(db.func.max(StudySession.actual_end_time)).scalar_subquery(),
+            db.select(db.func.count(Chapter.id)).scalar_subquery(),
+            db.select(db.func.max(Chapter.created_at)).scalar_subquery(),
+            db.select(db.func.sum(db.case((Chapter.is_completed, 1), else_=0))).scalar_subquery(),
+            db.select(db.func.max(Subject.created_at)).scalar_subquery(),
+        )
+    ).one()
+    # Next session, days remaining and the daily window all move with the clock
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    return hashlib.md5(f"{now}:{tuple(state)}".encode()).hexdigest()
+
+
+def _fetch_and_summarize(title: str) -> tuple:
+    """Fetch Wikipedia content and an AI summary for a chapter title.
+
+    Results are cached under the normalized title; Wikipedia misses and fallback
+    summaries are not. Raises LookupError when Wikipedia has nothing.
+    """
+    key = title.strip().lower()
+    cached = _content_cache.get(key)
+    if cached is not None:
+        return cached
+
+    content = wikipedia_service.fetch_topic_summary(title)
+    if not content:
+        raise LookupError(title)
+
+    agent = get_ai_agent()
+    summary = agent.generate_study_summary(title, content)
+    if not agent.is_fallback_summary(title, summary):
+        _content_cache.set(key, (content, summary))
+    return content, summary
 
 
 @app.route("/")
 def dashboard():
     """Main dashboard showing current progress and upcoming sessions"""
     try:
-        progress = schedule_manager.get_study_progress()
-        upcoming_sessions = schedule_manager.get_current_schedule(days_ahead=7)
-        recent_adaptations = schedule_manager.get_adaptations_history(limit=5)
+        manager = get_schedule_manager()
+        progress = _cached_dashboard("progress", manager.get_study_progress)
+        upcoming_sessions = _cached_dashboard("upcoming", manager.get_current_schedule, 7)
+        recent_adaptations = _cached_dashboard("adaptations", manager.get_adaptations_history, 5)
         subjects = Subject.query.all()
 
         return render_template(
@@ -58,14 +210,16 @@ def add_subjects():
     """Add subjects for exam preparation"""
     if request.method == "POST":
         try:
+            # Snapshot the form once instead of querying the MultiDict per field
+            form = request.form.to_dict()
             subjects_data = []
-            subject_count = int(request.form.get("subject_count", 1))
+            subject_count = int(form.get("subject_count", 1))
 
             for i in range(subject_count):
-                name = request.form.get(f"subject_name_{i}")
-                chapters = int(request.form.get(f"subject_chapters_{i}", 1))
-                difficulty = request.form.get(f"subject_difficulty_{i}", "medium")
-                exam_date_str = request.form.get(f"exam_date_{i}")
+                name = form.get(f"subject_name_{i}")
+                chapters = int(form.get(f"subject_chapters_{i}", 1))
+                difficulty = form.get(f"subject_difficulty_{i}", "medium")
+                exam_date_str = form.get(f"exam_date_{i}")
 
                 if name and exam_date_str:
                     subjects_data.append(
@@ -82,48 +236,61 @@ def add_subjects():
                 return render_template("add_subjects.html")
 
             flash("Analyzing subjects and creating study breakdown...", "info")
-            breakdown = ai_agent.break_down_subjects(subjects_data)
+            breakdown = get_ai_agent().break_down_subjects(subjects_data)
 
-            # Save subjects + chapters
-            for subject_data in subjects_data:
-                subject = Subject(
+            # Index the AI breakdown by subject name for O(1) lookups
+            ai_subjects = {
+                b["subject_name"].lower(): b for b in breakdown.get("breakdown", [])
+            }
+
+            # Subjects often share an exam date; parse each distinct one once
+            exam_dates = {
+                d: datetime.fromisoformat(d) for d in {s["exam_date"] for s in subjects_data}
+            }
+
+            # Save subjects, then flush once to get their ids
+            subjects = [
+                Subject(
                     name=subject_data["name"],
                     total_chapters=subject_data["total_chapters"],
                     difficulty_level=subject_data["difficulty"],
-                    exam_date=datetime.strptime(subject_data["exam_date"], "%Y-%m-%d"),
+                    exam_date=exam_dates[subject_data["exam_date"]],
                 )
-                db.session.add(subject)
-                db.session.flush()  # get subject.id
+                for subject_data in subjects_data
+            ]
+            db.session.add_all(subjects)
+            db.session.flush()
 
-                # find AI breakdown for this subject
-                ai_subject = None
-                for b in breakdown.get("breakdown", []):
-                    if b["subject_name"].lower() == subject_data["name"].lower():
-                        ai_subject = b
-                        break
+            chapter_rows = []
+            for subject, subject_data in zip(subjects, subjects_data):
+                ai_subject = ai_subjects.get(subject_data["name"].lower())
 
                 if ai_subject:
                     for ch in ai_subject.get("chapters", []):
-                        db.session.add(
-                            Chapter(
-                                subject_id=subject.id,
-                                title=ch["title"],
-                                estimated_hours=ch.get("estimated_hours", 2.0),
-                                difficulty=ch.get("difficulty", "medium"),
-                            )
+                        chapter_rows.append(
+                            {
+                                "subject_id": subject.id,
+                                "title": ch["title"],
+                                "estimated_hours": ch.get("estimated_hours", 2.0),
+                                "difficulty": ch.get("difficulty", "medium"),
+                            }
                         )
                 else:
                     for j in range(subject_data["total_chapters"]):
-                        db.session.add(
-                            Chapter(
-                                subject_id=subject.id,
-                                title=f"Chapter {j+1}",
-                                estimated_hours=2.0,
-                                difficulty=subject_data["difficulty"],
-                            )
+                        chapter_rows.append(
+                            {
+                                "subject_id": subject.id,
+                                "title": f"{subject_data['name']} - Chapter {j+1}",
+                                "estimated_hours": 2.0,
+                                "difficulty": subject_data["difficulty"],
+                            }
                         )
 
+            # One executemany INSERT for every chapter
+            db.session.bulk_insert_mappings(Chapter, chapter_rows)
+
             db.session.commit()
+            _invalidate_dashboard()
             flash("Subjects added successfully! Now create a study plan.", "success")
             return redirect(url_for("create_schedule"))
 
@@ -140,16 +307,13 @@ def create_schedule():
     """Create an AI-powered study schedule"""
     if request.method == "POST":
         try:
-            plan_name = request.form.get("plan_name", "Study Plan")
-            start_date_str = request.form.get("start_date")
-            end_date_str = request.form.get("end_date")
-            daily_hours = float(request.form.get("daily_hours", 6.0))
+            form = request.form.to_dict()
+            plan_name = form.get("plan_name", "Study Plan")
+            start_date_str = form.get("start_date")
+            end_date_str = form.get("end_date")
+            daily_hours = float(form.get("daily_hours", 6.0))
 
-            preferred_times = []
-            for i in range(3):
-                ts = request.form.get(f"time_slot_{i}")
-                if ts:
-                    preferred_times.append(ts)
+            preferred_times = [ts for ts in (form.get(f"time_slot_{i}") for i in range(3)) if ts]
 
             if not start_date_str or not end_date_str:
                 flash("Please provide start and end dates.", "error")
@@ -157,28 +321,30 @@ def create_schedule():
 
             study_plan = StudyPlan(
                 name=plan_name,
-                start_date=datetime.strptime(start_date_str, "%Y-%m-%d"),
-                end_date=datetime.strptime(end_date_str, "%Y-%m-%d"),
+                start_date=datetime.fromisoformat(start_date_str),
+                end_date=datetime.fromisoformat(end_date_str),
                 total_study_hours_per_day=daily_hours,
             )
             study_plan.set_preferred_times(preferred_times)
             db.session.add(study_plan)
             db.session.commit()
 
-            chapters = Chapter.query.all()
-            if not chapters:
+            if db.session.query(Chapter.id).limit(1).scalar() is None:
                 flash("No subjects found. Please add subjects first.", "error")
                 return redirect(url_for("add_subjects"))
 
-            chapters_data = [
-                {
-                    "title": ch.title,
-                    "subject_name": ch.subject.name,
-                    "estimated_hours": ch.estimated_hours,
-                    "difficulty": ch.difficulty,
-                }
-                for ch in chapters
-            ]
+            # Read-only projection straight from Core; no ORM objects needed
+            rows = db.session.execute(
+                db.select(
+                    Chapter.title,
+                    Subject.name.label("subject_name"),
+                    Chapter.estimated_hours,
+                    Chapter.difficulty,
+                )
+                .join(Subject, Chapter.subject_id == Subject.id)
+                .order_by(Chapter.id)
+            ).mappings()
+            chapters_data = [dict(row) for row in rows]
 
             plan_config = {
                 "start_date": start_date_str,
@@ -188,11 +354,12 @@ def create_schedule():
             }
 
             flash("Creating intelligent study schedule...", "info")
-            ai_schedule = ai_agent.create_study_schedule(chapters_data, plan_config)
+            ai_schedule = get_ai_agent().create_study_schedule(chapters_data, plan_config)
 
-            sessions = schedule_manager.create_sessions_from_ai_schedule(
+            sessions = get_schedule_manager().create_sessions_from_ai_schedule(
                 ai_schedule, study_plan.id
             )
+            _invalidate_dashboard()
 
             flash(
                 f"Study schedule created successfully! {len(sessions)} study sessions planned.",
@@ -205,7 +372,7 @@ def create_schedule():
             db.session.rollback()
             flash("Error creating schedule. Please try again.", "error")
 
-    subjects = Subject.query.all()
+    subjects = Subject.query.options(selectinload(Subject.chapters)).all()
     return render_template("schedule.html", subjects=subjects)
 
 
@@ -213,12 +380,13 @@ def create_schedule():
 def schedule_view():
     """View the current study schedule"""
     try:
-        upcoming_sessions = schedule_manager.get_current_schedule(days_ahead=14)
+        upcoming_sessions = get_schedule_manager().get_current_schedule(days_ahead=14)
 
-        schedule_by_date = {}
-        for s in upcoming_sessions:
-            date = s["scheduled_date"]
-            schedule_by_date.setdefault(date, []).append(s)
+        # Sessions arrive ordered by scheduled_date, so each day is one contiguous run
+        schedule_by_date = {
+            date: list(sessions)
+            for date, sessions in groupby(upcoming_sessions, key=lambda s: s["scheduled_date"])
+        }
 
         return render_template(
             "schedule.html", schedule_by_date=schedule_by_date, view_mode=True
@@ -245,13 +413,30 @@ def complete_session(session_id):
         # Try via schedule_manager first
         success = False
         try:
-            success = schedule_manager.mark_session_completed(session_id, notes)
+            success = get_schedule_manager().mark_session_completed(session_id, notes)
         except Exception as inner:
-            logger.warning("schedule_manager.mark_session_completed failed: %s", inner)
+            logger.warning("mark_session_completed failed: %s", inner)
+            db.session.rollback()
 
-        # Fallback: direct DB update
+        # Fallback: direct DB update; without notes a single UPDATE is enough
+        if not success and not notes:
+            result = db.session.execute(
+                db.update(StudySession)
+                .where(StudySession.id == session_id)
+                .values(status="completed", actual_end_time=datetime.utcnow())
+            )
+            if result.rowcount == 0:
+                msg = "Session not found."
+                if _wants_json():
+                    return jsonify({"ok": False, "error": msg}), 404
+                flash("Error completing session.", "error")
+                return redirect(url_for("dashboard"))
+            db.session.commit()
+            success = True
+
+        # Notes are appended to any existing ones, so that case loads the row
         if not success:
-            session = StudySession.query.get(session_id)
+            session = db.session.get(StudySession, session_id)
             if not session:
                 msg = "Session not found."
                 if _wants_json():
@@ -268,6 +453,7 @@ def complete_session(session_id):
             db.session.commit()
             success = True
 
+        _invalidate_dashboard()
         if _wants_json():
             return jsonify({"ok": True}), 200
 
@@ -294,66 +480,41 @@ def miss_session(session_id):
         else:
             reason = request.form.get("reason", "Not specified")
 
+        session = db.session.get(StudySession, session_id)
+        if not session:
+            msg = "Session not found."
+            if _wants_json():
+                return jsonify({"ok": False, "error": msg}), 404
+            flash("Error marking session as missed.", "error")
+            return redirect(url_for("dashboard"))
+
         # First, mark missed via schedule_manager
         success = False
         try:
-            success = schedule_manager.mark_session_missed(session_id, reason)
+            success = get_schedule_manager().mark_session_missed(session, reason)
         except Exception as inner:
-            logger.warning("schedule_manager.mark_session_missed failed: %s", inner)
+            logger.warning("mark_session_missed failed: %s", inner)
+            db.session.rollback()
 
         # Fallback: direct mark missed
         if not success:
-            session = StudySession.query.get(session_id)
-            if not session:
-                msg = "Session not found."
-                if _wants_json():
-                    return jsonify({"ok": False, "error": msg}), 404
-                flash("Error marking session as missed.", "error")
-                return redirect(url_for("dashboard"))
-
             session.status = "missed"
             if hasattr(session, "miss_reason"):
                 session.miss_reason = reason
             db.session.commit()
             success = True
 
-        # Try AI adaptation (best effort)
-        try:
-            session = StudySession.query.get(session_id)
-            if session:
-                missed_session_data = {
-                    "chapter_title": session.chapter.title,
-                    "scheduled_date": session.scheduled_date.strftime("%Y-%m-%d"),
-                    "start_time": session.scheduled_date.strftime("%H:%M"),
-                    "duration_hours": session.duration_hours,
-                    "miss_reason": reason,
-                }
-                upcoming_sessions = schedule_manager.get_current_schedule(days_ahead=14)
-                progress = schedule_manager.get_study_progress()
-
-                adaptation = ai_agent.adapt_schedule_for_missed_session(
-                    missed_session_data, upcoming_sessions, progress
-                )
-
-                adaptation_success = schedule_manager.apply_schedule_adaptation(
-                    adaptation, session_id, f"missed_session: {reason}"
-                )
-            else:
-                adaptation_success = False
-        except Exception as inner:
-            logger.warning("AI reschedule failed: %s", inner)
-            adaptation_success = False
+        # AI adaptation (best effort) runs in the background; clients can poll its status
+        _submit_reschedule(session_id, reason)
 
+        _invalidate_dashboard()
         if _wants_json():
-            return jsonify({"ok": True, "rescheduled": bool(adaptation_success)}), 200
+            return jsonify({"ok": True, "rescheduled": "pending"}), 200
 
-        if adaptation_success:
-            flash("Session rescheduled intelligently by AI!", "success")
-        else:
-            flash(
-                "Session marked as missed. Automatic rescheduling may not have applied.",
-                "warning",
-            )
+        flash(
+            "Session marked as missed. AI rescheduling is running in the background.",
+            "info",
+        )
         return redirect(url_for("dashboard"))
 
     except Exception as e:
@@ -365,22 +526,38 @@ def miss_session(session_id):
         return redirect(url_for("dashboard"))
 
 
+@app.route("/session/<int:session_id>/adaptation-status")
+def adaptation_status(session_id):
+    """Report whether the background reschedule for a missed session has finished."""
+    with _reschedule_jobs_lock:
+        job = _reschedule_jobs.get(session_id)
+    if job is not None and not job.done():
+        status = "pending"
+    elif job is not None:
+        status = "done" if job.result() else "failed"
+    else:
+        # Job unknown to this process (finished and pruned, or a restart): ask the DB
+        adapted = ScheduleAdaptation.query.filter_by(original_session_id=session_id).first()
+        status = "done" if adapted else "unknown"
+
+    return jsonify({"ok": True, "session_id": session_id, "status": status}), 200
+
+
 @app.route("/fetch-content/<int:chapter_id>")
 def fetch_content(chapter_id):
     """Fetch Wikipedia content for a chapter"""
     try:
-        chapter = Chapter.query.get_or_404(chapter_id)
+        chapter = db.get_or_404(Chapter, chapter_id)
 
-        content = wikipedia_service.fetch_topic_summary(chapter.title)
-
-        if content:
-            summary = ai_agent.generate_study_summary(chapter.title, content)
+        try:
+            content, summary = _fetch_and_summarize(chapter.title)
+        except LookupError:
+            flash(f"No Wikipedia content found for {chapter.title}.", "warning")
+        else:
             chapter.wikipedia_content = content
             chapter.summary = summary
             db.session.commit()
             flash(f"Study content fetched for {chapter.title}!", "success")
-        else:
-            flash(f"No Wikipedia content found for {chapter.title}.", "warning")
 
     except Exception as e:
         logger.exception("Error fetching content: %s", e)
@@ -389,35 +566,99 @@ def fetch_content(chapter_id):
     return redirect(url_for("progress"))
 
 
+@app.route("/stream-summary/<int:chapter_id>")
+def stream_summary(chapter_id):
+    """Stream an AI study summary for a chapter as server-sent events"""
+    chapter = db.get_or_404(Chapter, chapter_id)
+    content = chapter.wikipedia_content or wikipedia_service.fetch_topic_summary(chapter.title)
+
+    def generate():
+        parts = []
+        pending = []
+        last_flush = time.monotonic()
+
+        try:
+            for chunk in get_ai_agent().generate_study_summary_stream(chapter.title, content, fallback=False):
+                parts.append(chunk)
+                pending.append(chunk)
+                # Batch tokens into ~50 ms events to keep per-event overhead low
+                if time.monotonic() - last_flush >= SSE_FLUSH_INTERVAL:
+                    yield _sse_event("".join(pending))
+                    pending.clear()
+                    last_flush = time.monotonic()
+        except Exception:
+            # Already logged by the agent; a partial summary is never saved
+            if pending:
+                yield _sse_event("".join(pending))
+            yield _sse_event("Summary generation failed, please try again.", event="error")
+            return
+
+        if pending:
+            yield _sse_event("".join(pending))
+
+        try:
+            chapter.summary = "".join(parts)
+            if content:
+                chapter.wikipedia_content = content
+            db.session.commit()
+        except Exception as e:
+            logger.exception("Error saving streamed summary: %s", e)
+            db.session.rollback()
+
+        yield _sse_event("", event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/progress")
 def progress():
     """View detailed progress and chapter content"""
     try:
-        subjects = Subject.query.all()
-        progress_data = schedule_manager.get_study_progress()
+        # Subject cards only count chapters, so skip the large text columns
+        subjects = Subject.query.options(
+            selectinload(Subject.chapters).load_only(Chapter.id, Chapter.is_completed)
+        ).all()
+        progress_data = get_schedule_manager().get_study_progress()
+
+        # Truncate Wikipedia content in SQL so full blobs never leave the database
+        rows = db.session.execute(
+            db.select(
+                Chapter.id,
+                Chapter.title,
+                Subject.name.label("subject_name"),
+                Chapter.is_completed,
+                Chapter.difficulty,
+                Chapter.estimated_hours,
+                Chapter.summary,
+                db.func.substr(Chapter.wikipedia_content, 1, 500).label("preview"),
+                db.func.length(Chapter.wikipedia_content).label("wlen"),
+            )
+            .join(Subject, Chapter.subject_id == Subject.id)
+            .order_by(Subject.id, Chapter.id)
+        ).mappings()
 
         chapters_with_content = []
-        for subject in subjects:
-            for chapter in subject.chapters:
-                chapters_with_content.append(
-                    {
-                        "id": chapter.id,
-                        "title": chapter.title,
-                        "subject_name": subject.name,
-                        "is_completed": chapter.is_completed,
-                        "difficulty": chapter.difficulty,
-                        "estimated_hours": chapter.estimated_hours,
-                        "has_summary": bool(chapter.summary),
-                        "has_wikipedia_content": bool(chapter.wikipedia_content),
-                        "summary": chapter.summary,
-                        "wikipedia_content": (
-                            chapter.wikipedia_content[:500] + "..."
-                            if chapter.wikipedia_content
-                            and len(chapter.wikipedia_content) > 500
-                            else chapter.wikipedia_content
-                        ),
-                    }
-                )
+        for row in rows:
+            chapters_with_content.append(
+                {
+                    "id": row["id"],
+                    "title": row["title"],
+                    "subject_name": row["subject_name"],
+                    "is_completed": row["is_completed"],
+                    "difficulty": row["difficulty"],
+                    "estimated_hours": row["estimated_hours"],
+                    "has_summary": bool(row["summary"]),
+                    "has_wikipedia_content": bool(row["wlen"]),
+                    "summary": row["summary"],
+                    "wikipedia_content": (
+                        row["preview"] + "..." if row["wlen"] and row["wlen"] > 500 else row["preview"]
+                    ),
+                }
+            )
 
         return render_template(
             "progress.html",
@@ -436,30 +677,60 @@ def progress():
 def progress_chart_data():
     """API endpoint for progress chart data"""
     try:
-        progress = schedule_manager.get_study_progress()
-
-        subjects = Subject.query.all()
+        etag = _progress_chart_etag()
+        if request.if_none_match.contains_weak(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
+
+        progress = get_schedule_manager().get_study_progress()
+
+        subject_rows = (
+            db.session.query(
+                Subject.name,
+                db.func.count(Chapter.id),
+                db.func.sum(db.case((Chapter.is_completed, 1), else_=0)),
+            )
+            .outerjoin(Chapter, Chapter.subject_id == Subject.id)
+            .group_by(Subject.id, Subject.name)
+            .order_by(Subject.id)
+            .all()
+        )
         subject_progress = []
-        for subject in subjects:
-            total = len(subject.chapters)
-            completed = sum(1 for ch in subject.chapters if ch.is_completed)
+        for name, total, completed in subject_rows:
+            completed = completed or 0
             rate = (completed / total * 100) if total > 0 else 0
             subject_progress.append(
-                {"name": subject.name, "total": total, "completed": completed, "rate": round(rate, 1)}
+                {"name": name, "total": total, "completed": completed, "rate": round(rate, 1)}
+            )
+
+        # Completed sessions per day over the last 14 days (excluding today)
+        now = datetime.now()
+        today_start = datetime.combine(now.date(), datetime.min.time())
+        session_day = db.func.date(StudySession.actual_end_time)
+        counts = dict(
+            db.session.query(session_day, db.func.count(StudySession.id))
+            .filter(
+                StudySession.status == "completed",
+                StudySession.actual_end_time >= today_start - timedelta(days=14),
+                StudySession.actual_end_time < today_start,
             )
+            .group_by(session_day)
+            .all()
+        )
+        # SQLite returns date() as text, other backends as a date
+        counts = {str(day): n for day, n in counts.items()}
 
         daily = []
         for i in range(14, 0, -1):
-            date = datetime.now() - timedelta(days=i)
-            sessions_count = (
-                StudySession.query.filter(
-                    db.func.date(StudySession.actual_end_time) == date.date(),
-                    StudySession.status == "completed",
-                ).count()
+            date = now - timedelta(days=i)
+            daily.append(
+                {"date": date.strftime("%m/%d"), "sessions": counts.get(date.date().isoformat(), 0)}
             )
-            daily.append({"date": date.strftime("%m/%d"), "sessions": sessions_count})
 
-        return jsonify({"overall": progress, "by_subject": subject_progress, "daily": daily})
+        resp = jsonify({"overall": progress, "by_subject": subject_progress, "daily": daily})
+        resp.set_etag(etag, weak=True)
+        return resp
 
     except Exception as e:
         logger.exception("Error generating chart data: %s", e)
@@ -470,13 +741,13 @@ def progress_chart_data():
 def reset_schedule():
     """Reset the entire study schedule (for testing/demo purposes)"""
     try:
-        StudySession.query.delete()
-        Chapter.query.delete()
-        Subject.query.delete()
-        StudyPlan.query.delete()
-        ScheduleAdaptation.query.delete()
+        # One transaction for the whole reset; children go first to satisfy FKs
+        with db.session.begin():
+            for model in (ScheduleAdaptation, StudySession, Chapter, Subject, StudyPlan):
+                model.query.delete(synchronize_session=False)
+        _invalidate_dashboard()
+        _content_cache.clear()
 
-        db.session.commit()
         flash("Schedule reset successfully. You can now start fresh.", "success")
 
     except Exception as e:
@@ -487,6 +758,57 @@ def reset_schedule():
     return redirect(url_for("dashboard"))
 
 
+# -------- Background summary batches (run via `flask <command>`, e.g. from cron) -------- #
+
+@app.cli.command("submit-summary-batch")
+def submit_summary_batch():
+    """Queue AI summaries for every chapter that does not have one yet."""
+    chapters = Chapter.query.filter(Chapter.summary.is_(None)).all()
+    if not chapters:
+        click.echo("All chapters already have summaries.")
+        return
+
+    batch_id = get_ai_agent().submit_summary_batch(chapters)
+    # Report the id before touching the database so a paid batch is never lost
+    click.echo(f"Submitted summary batch {batch_id} for {len(chapters)} chapters.")
+
+    try:
+        db.session.add(SummaryBatch(batch_id=batch_id, chapter_count=len(chapters)))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Failed to record summary batch %s: %s", batch_id, e)
+        raise click.ClickException(f"Batch {batch_id} was submitted but could not be recorded.")
+
+
+@app.cli.command("poll-summary-batches")
+def poll_summary_batches():
+    """Write the results of finished summary batches back to their chapters."""
+    for batch in SummaryBatch.query.filter_by(status="submitted").all():
+        try:
+            result = get_ai_agent().get_summary_batch(batch.batch_id)
+        except Exception as e:
+            logger.warning("Summary batch %s lookup failed: %s", batch.batch_id, e)
+            continue
+
+        if result["status"] in ("validating", "in_progress", "finalizing"):
+            click.echo(f"Batch {batch.batch_id} is still {result['status']}.")
+            continue
+
+        for chapter_id, summary in result["summaries"].items():
+            chapter = db.session.get(Chapter, chapter_id)
+            if chapter:
+                chapter.summary = summary
+
+        batch.status = "completed" if result["status"] == "completed" else "failed"
+        batch.completed_at = datetime.utcnow()
+        db.session.commit()
+        click.echo(
+            f"Batch {batch.batch_id} {batch.status}: "
+            f"{len(result['summaries'])} summaries saved."
+        )
+
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template("layout.html"), 404
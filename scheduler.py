@@ -1,12 +1,52 @@
-import json
+import functools
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from models import StudySession, StudyPlan, Chapter, ScheduleAdaptation
+from typing import List, Dict, Any, Optional, Tuple, Union
+from sqlalchemy.orm import raiseload, selectinload
+from models import StudySession, StudyPlan, Chapter, ScheduleAdaptation, Subject
 from application import db
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _session_list_options() -> tuple:
+    """Loader options for session listings: chapter -> subject up front, other relationships raise
+
+    Built at query time because StudySession.chapter is a backref that only exists once
+    the mappers are configured.
+    """
+    return (
+        # Subjects loaded here are reused by the dashboard, which counts their chapters,
+        # so Subject.chapters stays lazily loadable rather than raising
+        selectinload(StudySession.chapter).selectinload(Chapter.subject).lazyload(Subject.chapters),
+        selectinload(StudySession.chapter).raiseload('*'),
+        raiseload('*'),
+    )
+
+@functools.lru_cache(maxsize=1024)
+def _parse_slot(value: str) -> datetime:
+    """Parse a 'YYYY-MM-DD HH:MM' slot; AI schedules reuse the same slots, so results are memoized"""
+    if len(value) == 16:
+        # Canonical fixed-width form: use the C ISO parser instead of interpreting a format string
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    # Looser AI output such as '2024-05-01 9:00' still parses as before
+    return datetime.strptime(value, '%Y-%m-%d %H:%M')
+
+@functools.lru_cache(maxsize=256)
+def _format_changes_summary(reschedule_slot: Optional[Tuple[str, str]], adjusted_count: int) -> str:
+    """Summary text for a reschedule slot and adjustment count; history rows repeat these often"""
+    summary_parts = []
+    
+    if reschedule_slot:
+        summary_parts.append(f"Rescheduled to {reschedule_slot[0]} at {reschedule_slot[1]}")
+    
+    if adjusted_count:
+        summary_parts.append(f"{adjusted_count} other sessions adjusted")
+    
+    return "; ".join(summary_parts) if summary_parts else "Schedule optimization applied"
+
 class ScheduleManager:
     """Manages study schedules and handles adaptations"""
     
@@ -16,38 +56,51 @@ class ScheduleManager:
     def create_sessions_from_ai_schedule(self, ai_schedule: Dict, study_plan_id: int) -> List[StudySession]:
         """Convert AI-generated schedule to database sessions"""
         sessions = []
+        days = ai_schedule.get('schedule', [])
+        
+        # Resolve every referenced chapter title in one query (first chapter wins on duplicates)
+        titles = {s['chapter_title'] for day in days for s in day.get('sessions', [])}
+        chapter_ids = {}
+        if titles:
+            rows = db.session.query(Chapter.id, Chapter.title).filter(
+                Chapter.title.in_(titles)
+            ).order_by(Chapter.id)
+            for chapter_id, title in rows:
+                chapter_ids.setdefault(title, chapter_id)
         
-        for day_schedule in ai_schedule.get('schedule', []):
+        for day_schedule in days:
             date_str = day_schedule['date']
             schedule_date = datetime.strptime(date_str, '%Y-%m-%d')
             
             for session_data in day_schedule.get('sessions', []):
                 # Find the corresponding chapter
-                chapter = Chapter.query.filter_by(title=session_data['chapter_title']).first()
+                chapter_id = chapter_ids.get(session_data['chapter_title'])
                 
-                if chapter:
+                if chapter_id:
                     # Parse time
-                    start_time = datetime.strptime(f"{date_str} {session_data['start_time']}", '%Y-%m-%d %H:%M')
+                    start_time = _parse_slot(f"{date_str} {session_data['start_time']}")
                     
                     session = StudySession(
-                        chapter_id=chapter.id,
+                        chapter_id=chapter_id,
                         scheduled_date=start_time,
                         duration_hours=session_data['duration_hours'],
                         status='scheduled'
                     )
                     
-                    db.session.add(session)
                     sessions.append(session)
         
+        # One executemany INSERT for the whole schedule
+        db.session.bulk_save_objects(sessions)
         db.session.commit()
         return sessions
     
     def get_current_schedule(self, days_ahead: int = 7) -> List[Dict]:
         """Get upcoming study sessions"""
-        end_date = datetime.now() + timedelta(days=days_ahead)
+        now = datetime.now()
+        end_date = now + timedelta(days=days_ahead)
         
-        sessions = StudySession.query.filter(
-            StudySession.scheduled_date >= datetime.now(),
+        sessions = StudySession.query.options(*_session_list_options()).filter(
+            StudySession.scheduled_date >= now,
             StudySession.scheduled_date <= end_date,
             StudySession.status.in_(['scheduled', 'rescheduled'])
         ).order_by(StudySession.scheduled_date).all()
@@ -69,32 +122,37 @@ class ScheduleManager:
     
     def mark_session_completed(self, session_id: int, notes: str = None) -> bool:
         """Mark a study session as completed"""
-        session = StudySession.query.get(session_id)
+        session = db.session.get(StudySession, session_id)
         if not session:
             return False
         
+        now = datetime.now()
         session.status = 'completed'
-        session.actual_start_time = datetime.now() - timedelta(hours=session.duration_hours)
-        session.actual_end_time = datetime.now()
+        session.actual_end_time = now
+        session.actual_start_time = now - timedelta(hours=session.duration_hours)
         session.notes = notes
-        session.updated_at = datetime.now()
-        
-        # Mark chapter as completed if this was the last session
-        chapter = session.chapter
-        remaining_sessions = StudySession.query.filter_by(
-            chapter_id=chapter.id, 
-            status='scheduled'
-        ).count()
+        session.updated_at = now
         
-        if remaining_sessions == 0:
-            chapter.is_completed = True
+        # Mark chapter as completed if this was the last session, decided by the database in one UPDATE
+        db.session.flush()
+        still_scheduled = db.exists().where(
+            StudySession.chapter_id == session.chapter_id,
+            StudySession.status == 'scheduled'
+        )
+        db.session.execute(
+            db.update(Chapter)
+            .where(Chapter.id == session.chapter_id, ~still_scheduled)
+            .values(is_completed=True)
+            .execution_options(synchronize_session=False)
+        )
         
         db.session.commit()
         return True
     
-    def mark_session_missed(self, session_id: int, reason: str = None) -> bool:
-        """Mark a study session as missed"""
-        session = StudySession.query.get(session_id)
+    def mark_session_missed(self, session: Union[int, StudySession], reason: str = None) -> bool:
+        """Mark a study session as missed; accepts a session id or an already loaded session"""
+        if not isinstance(session, StudySession):
+            session = db.session.get(StudySession, session)
         if not session:
             return False
         
@@ -107,8 +165,9 @@ class ScheduleManager:
     
     def apply_schedule_adaptation(self, adaptation_plan: Dict, original_session_id: int, reason: str) -> bool:
         """Apply AI-generated schedule adaptation"""
+        now = datetime.now()
         try:
-            original_session = StudySession.query.get(original_session_id)
+            original_session = db.session.get(StudySession, original_session_id)
             if not original_session:
                 return False
             
@@ -117,7 +176,7 @@ class ScheduleManager:
                 original_session_id=original_session_id,
                 adaptation_reason=reason,
                 ai_reasoning=adaptation_plan.get('reasoning', ''),
-                changes_made=json.dumps(adaptation_plan)
+                changes_made=adaptation_plan
             )
             db.session.add(adaptation)
             
@@ -126,7 +185,7 @@ class ScheduleManager:
             if reschedule_info:
                 new_date_str = reschedule_info['new_date']
                 new_time_str = reschedule_info['new_time']
-                new_datetime = datetime.strptime(f"{new_date_str} {new_time_str}", '%Y-%m-%d %H:%M')
+                new_datetime = _parse_slot(f"{new_date_str} {new_time_str}")
                 
                 # Create new session for the rescheduled content
                 new_session = StudySession(
@@ -138,25 +197,37 @@ class ScheduleManager:
                 db.session.add(new_session)
             
             # Apply other schedule adjustments
-            adjustments = adaptation_plan.get('adaptation_plan', {}).get('schedule_adjustments', [])
-            for adjustment in adjustments:
-                if adjustment['change_type'] == 'reschedule':
-                    # Find and update the session
-                    chapter = Chapter.query.filter_by(title=adjustment['original_session']).first()
-                    if chapter:
-                        session_to_adjust = StudySession.query.filter_by(
-                            chapter_id=chapter.id,
-                            status='scheduled'
-                        ).first()
-                        
-                        if session_to_adjust:
-                            new_datetime = datetime.strptime(
-                                f"{adjustment['new_date']} {adjustment['new_time']}", 
-                                '%Y-%m-%d %H:%M'
-                            )
-                            session_to_adjust.scheduled_date = new_datetime
-                            session_to_adjust.status = 'rescheduled'
-                            session_to_adjust.updated_at = datetime.now()
+            adjustments = [
+                adjustment
+                for adjustment in adaptation_plan.get('adaptation_plan', {}).get('schedule_adjustments', [])
+                if adjustment['change_type'] == 'reschedule'
+            ]
+            if adjustments:
+                # Resolve every adjusted chapter, then all of their scheduled sessions, in two queries
+                titles = {adjustment['original_session'] for adjustment in adjustments}
+                chapter_ids = {}
+                for chapter_id, title in db.session.query(Chapter.id, Chapter.title).filter(
+                    Chapter.title.in_(titles)
+                ).order_by(Chapter.id):
+                    chapter_ids.setdefault(title, chapter_id)
+                
+                scheduled_by_chapter = {}
+                if chapter_ids:
+                    for scheduled in StudySession.query.filter(
+                        StudySession.chapter_id.in_(set(chapter_ids.values())),
+                        StudySession.status == 'scheduled'
+                    ).order_by(StudySession.id):
+                        scheduled_by_chapter.setdefault(scheduled.chapter_id, []).append(scheduled)
+                
+                for adjustment in adjustments:
+                    # Find and update the session; each one is only moved once
+                    candidates = scheduled_by_chapter.get(chapter_ids.get(adjustment['original_session']))
+                    if candidates:
+                        session_to_adjust = candidates.pop(0)
+                        new_datetime = _parse_slot(f"{adjustment['new_date']} {adjustment['new_time']}")
+                        session_to_adjust.scheduled_date = new_datetime
+                        session_to_adjust.status = 'rescheduled'
+                        session_to_adjust.updated_at = now
             
             db.session.commit()
             return True
@@ -168,25 +239,34 @@ class ScheduleManager:
     
     def get_study_progress(self) -> Dict[str, Any]:
         """Calculate overall study progress"""
-        total_sessions = StudySession.query.count()
-        completed_sessions = StudySession.query.filter_by(status='completed').count()
-        missed_sessions = StudySession.query.filter_by(status='missed').count()
+        now = datetime.now()
+        # One GROUP BY per table instead of a COUNT per status
+        sessions_by_status = dict(
+            db.session.query(StudySession.status, db.func.count(StudySession.id))
+            .group_by(StudySession.status).all()
+        )
+        total_sessions = sum(sessions_by_status.values())
+        completed_sessions = sessions_by_status.get('completed', 0)
+        missed_sessions = sessions_by_status.get('missed', 0)
         
-        total_chapters = Chapter.query.count()
-        completed_chapters = Chapter.query.filter_by(is_completed=True).count()
+        chapters_by_completion = dict(
+            db.session.query(Chapter.is_completed, db.func.count(Chapter.id))
+            .group_by(Chapter.is_completed).all()
+        )
+        total_chapters = sum(chapters_by_completion.values())
+        completed_chapters = chapters_by_completion.get(True, 0)
         
         # Get next upcoming session
         next_session = StudySession.query.filter(
-            StudySession.scheduled_date >= datetime.now(),
+            StudySession.scheduled_date >= now,
             StudySession.status.in_(['scheduled', 'rescheduled'])
         ).order_by(StudySession.scheduled_date).first()
         
         # Calculate days remaining until first exam
-        from models import Subject
-        earliest_exam = Subject.query.order_by(Subject.exam_date).first()
+        earliest_exam_date = db.session.query(db.func.min(Subject.exam_date)).scalar()
         days_remaining = 0
-        if earliest_exam:
-            days_remaining = (earliest_exam.exam_date - datetime.now()).days
+        if earliest_exam_date:
+            days_remaining = (earliest_exam_date - now).days
         
         completion_rate = (completed_sessions / total_sessions * 100) if total_sessions > 0 else 0
         
@@ -209,7 +289,7 @@ class ScheduleManager:
     
     def get_missed_sessions(self) -> List[Dict]:
         """Get all missed sessions that need rescheduling"""
-        missed = StudySession.query.filter_by(status='missed').all()
+        missed = StudySession.query.options(*_session_list_options()).filter_by(status='missed').all()
         
         missed_data = []
         for session in missed:
@@ -228,39 +308,44 @@ class ScheduleManager:
     
     def get_adaptations_history(self, limit: int = 10) -> List[Dict]:
         """Get history of schedule adaptations"""
-        adaptations = ScheduleAdaptation.query.order_by(
-            ScheduleAdaptation.created_at.desc()
-        ).limit(limit).all()
+        # One outer-joined SELECT of just the needed columns; no ORM objects are built
+        rows = db.session.query(
+            ScheduleAdaptation.id,
+            ScheduleAdaptation.created_at,
+            ScheduleAdaptation.adaptation_reason,
+            ScheduleAdaptation.ai_reasoning,
+            ScheduleAdaptation.changes_made,
+            Chapter.title,
+            Subject.name
+        ).outerjoin(
+            StudySession, StudySession.id == ScheduleAdaptation.original_session_id
+        ).outerjoin(
+            Chapter, Chapter.id == StudySession.chapter_id
+        ).outerjoin(
+            Subject, Subject.id == Chapter.subject_id
+        ).order_by(ScheduleAdaptation.created_at.desc()).limit(limit).all()
         
         history = []
-        for adaptation in adaptations:
-            original_session = StudySession.query.get(adaptation.original_session_id)
-            changes_data = json.loads(adaptation.changes_made) if adaptation.changes_made else {}
-            
+        for adaptation_id, created_at, reason, ai_reasoning, changes_made, chapter_title, subject_name in rows:
+            # A missing original session leaves the joined columns NULL
             history.append({
-                'id': adaptation.id,
-                'date': adaptation.created_at.strftime('%Y-%m-%d %H:%M'),
-                'reason': adaptation.adaptation_reason,
-                'chapter_title': original_session.chapter.title if original_session else 'Unknown',
-                'subject_name': original_session.chapter.subject.name if original_session else 'Unknown',
-                'ai_reasoning': adaptation.ai_reasoning,
-                'changes_summary': self._summarize_changes(changes_data)
+                'id': adaptation_id,
+                'date': created_at.strftime('%Y-%m-%d %H:%M'),
+                'reason': reason,
+                'chapter_title': chapter_title if chapter_title is not None else 'Unknown',
+                'subject_name': subject_name if subject_name is not None else 'Unknown',
+                'ai_reasoning': ai_reasoning,
+                'changes_summary': self._summarize_changes(changes_made or {})
             })
         
         return history
     
     def _summarize_changes(self, changes_data: Dict) -> str:
         """Create a human-readable summary of changes made"""
-        summary_parts = []
-        
         adaptation_plan = changes_data.get('adaptation_plan', {})
         reschedule = adaptation_plan.get('reschedule_missed', {})
         
-        if reschedule:
-            summary_parts.append(f"Rescheduled to {reschedule['new_date']} at {reschedule['new_time']}")
-        
+        # Reduce the plan to the hashable parts the summary depends on, then reuse cached text
+        reschedule_slot = (reschedule['new_date'], reschedule['new_time']) if reschedule else None
         adjustments = adaptation_plan.get('schedule_adjustments', [])
-        if adjustments:
-            summary_parts.append(f"{len(adjustments)} other sessions adjusted")
-        
-        return "; ".join(summary_parts) if summary_parts else "Schedule optimization applied"
+        return _format_changes_summary(reschedule_slot, len(adjustments) if adjustments else 0)
@@ -0,0 +1,9 @@
+import os
+
+
+def test_application_imports():
+    """Importing the app wires up models, routes and services without errors"""
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    import application
+
+    assert "dashboard" in application.app.view_functions
@@ -1,19 +1,105 @@
+import os
 import requests
 import logging
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 import re
 
+from cache import SQLiteCache, TTLCache
+
 logger = logging.getLogger(__name__)
 
+# HTML tags, citation numbers and parenthetical notes, stripped in a single pass
+_RE_STRIP = re.compile(r'<[^>]+>|\[[0-9]+\]|\([^)]*\)')
+
+# Sent with every Wikipedia request, as their API etiquette asks clients to identify themselves
+_HEADERS = {'User-Agent': 'StudyPlannerApp/1.0 (Educational Use)'}
+
+# Wikipedia pages change rarely; successful lookups are reused for a day
+WIKI_CACHE_TTL = 86400
+
+# Summaries are also persisted so they survive restarts and are shared between processes;
+# unless overridden the file lives in the Flask instance folder, next to the app database
+WIKI_CACHE_PATH = os.environ.get("WIKI_CACHE_PATH")
+
+# Requests to Wikipedia start at least this far apart (seconds), across all threads
+WIKI_MIN_REQUEST_INTERVAL = 0.25
+WIKI_MAX_WORKERS = 4
+
+class _RateLimiter:
+    """Spaces out calls so that at most one starts per interval, shared between threads"""
+    
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+    
+    def wait(self):
+        """Block until the caller may start its request"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+
 class WikipediaService:
     """Service for fetching educational content from Wikipedia"""
     
     def __init__(self):
         self.api_url = "https://en.wikipedia.org/api/rest_v1/page/summary/"
         self.search_api_url = "https://en.wikipedia.org/w/api.php"
+        # Keyed by normalized topic; misses and failures are not cached so they are retried
+        self._summary_cache = TTLCache(ttl=WIKI_CACHE_TTL, maxsize=1024)
+        self._page_cache = TTLCache(ttl=WIKI_CACHE_TTL, maxsize=1024)
+        # Opened on first use so importing the module never creates files
+        self._summary_store = None
+        self._store_lock = threading.Lock()
+        # One keep-alive session for every call; the limiter replaces fixed per-topic sleeps
+        self.session = requests.Session()
+        self.session.headers.update(_HEADERS)
+        retries = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries))
+        self._rate_limiter = _RateLimiter(WIKI_MIN_REQUEST_INTERVAL)
+    
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """Rate-limited GET through the shared session"""
+        self._rate_limiter.wait()
+        return self.session.get(url, **kwargs)
+    
+    def _store(self) -> SQLiteCache:
+        """Persistent summary cache, opened on first use"""
+        with self._store_lock:
+            if self._summary_store is None:
+                path = WIKI_CACHE_PATH
+                if path is None:
+                    from application import app
+                    os.makedirs(app.instance_path, exist_ok=True)
+                    path = os.path.join(app.instance_path, "wiki_cache.db")
+                self._summary_store = SQLiteCache(path, table="wiki_summaries")
+            return self._summary_store
+    
+    @staticmethod
+    def _topic_key(topic: str) -> str:
+        """Normalize a topic for cache lookups"""
+        return topic.strip().lower()
     
     def fetch_topic_summary(self, topic: str) -> Optional[str]:
         """Fetch a summary for a given topic from Wikipedia"""
+        key = self._topic_key(topic)
+        cached = self._summary_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        cached = self._store().get(key)
+        if cached is not None:
+            self._summary_cache.set(key, cached)
+            return cached
+        
         try:
             # First, search for the best matching page
             page_title = self._search_for_page(topic)
@@ -23,11 +109,7 @@ class WikipediaService:
             
             # Fetch the page summary
             summary_url = f"{self.api_url}{page_title}"
-            headers = {
-                'User-Agent': 'StudyPlannerApp/1.0 (Educational Use)'
-            }
-            
-            response = requests.get(summary_url, headers=headers, timeout=10)
+            response = self._get(summary_url, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -38,6 +120,8 @@ class WikipediaService:
                 # Clean up the text
                 cleaned_summary = self._clean_wikipedia_text(extract)
                 logger.info(f"Successfully fetched summary for: {topic}")
+                self._summary_cache.set(key, cleaned_summary)
+                self._store().set(key, cleaned_summary, expire=WIKI_CACHE_TTL)
                 return cleaned_summary
             else:
                 logger.warning(f"No extract available for: {topic}")
@@ -52,6 +136,11 @@ class WikipediaService:
     
     def _search_for_page(self, topic: str) -> Optional[str]:
         """Search Wikipedia for the most relevant page title"""
+        key = self._topic_key(topic)
+        cached = self._page_cache.get(key)
+        if cached is not None:
+            return cached
+        
         try:
             params = {
                 'action': 'query',
@@ -62,11 +151,7 @@ class WikipediaService:
                 'srprop': 'snippet'
             }
             
-            headers = {
-                'User-Agent': 'StudyPlannerApp/1.0 (Educational Use)'
-            }
-            
-            response = requests.get(self.search_api_url, params=params, headers=headers, timeout=10)
+            response = self._get(self.search_api_url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -75,7 +160,9 @@ class WikipediaService:
             if search_results:
                 # Return the title of the most relevant result
                 best_match = search_results[0]
-                return best_match['title'].replace(' ', '_')
+                page_title = best_match['title'].replace(' ', '_')
+                self._page_cache.set(key, page_title)
+                return page_title
             else:
                 return None
                 
@@ -88,42 +175,27 @@ class WikipediaService:
         if not text:
             return ""
         
-        # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # Remove Wikipedia-specific formatting
-        text = re.sub(r'\[[0-9]+\]', '', text)  # Remove citation numbers
-        text = re.sub(r'\([^)]*\)', '', text)   # Remove parenthetical notes (optional)
+        # Remove HTML tags and Wikipedia-specific formatting (citations, parenthetical notes)
+        text = _RE_STRIP.sub('', text)
         
         # Clean up whitespace
         text = ' '.join(text.split())
         
         # Limit length for study purposes
         if len(text) > 1000:
-            sentences = text.split('.')
-            summary = ''
-            for sentence in sentences:
-                if len(summary) + len(sentence) < 800:
-                    summary += sentence + '.'
-                else:
-                    break
-            text = summary
+            # Keep whole sentences within the first 800 characters
+            head = text[:800]
+            end = head.rfind('.')
+            text = head[:end + 1] if end != -1 else head
         
         return text.strip()
     
     def fetch_multiple_topics(self, topics: list) -> dict:
         """Fetch summaries for multiple topics"""
-        results = {}
-        
-        for topic in topics:
-            summary = self.fetch_topic_summary(topic)
-            results[topic] = summary
-            
-            # Add a small delay to be respectful to Wikipedia's servers
-            import time
-            time.sleep(0.5)
-        
-        return results
+        # Topics are fetched in parallel; the shared rate limiter keeps us respectful to
+        # Wikipedia's servers, and cache hits never reach them
+        with ThreadPoolExecutor(max_workers=WIKI_MAX_WORKERS) as executor:
+            return dict(zip(topics, executor.map(self.fetch_topic_summary, topics)))
     
     def search_related_topics(self, main_topic: str, limit: int = 5) -> list:
         """Find related topics for additional study material"""
@@ -138,11 +210,7 @@ class WikipediaService:
                 'srprop': 'snippet|size'
             }
             
-            headers = {
-                'User-Agent': 'StudyPlannerApp/1.0 (Educational Use)'
-            }
-            
-            response = requests.get(self.search_api_url, params=params, headers=headers, timeout=10)
+            response = self._get(self.search_api_url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()